@@ -6,46 +6,53 @@ from django.urls import reverse
 from sentry import audit_log
 from sentry.constants import SentryAppInstallationStatus
 from sentry.mediators.token_exchange import GrantExchanger
-from sentry.models import AuditLogEntry
+from sentry.models import AuditLogEntry, SentryAppInstallation
 from sentry.testutils import APITestCase
+from sentry.testutils.factories import Factories
 from sentry.testutils.silo import control_silo_test
 
 
 @control_silo_test(stable=True)
 class SentryAppInstallationDetailsTest(APITestCase):
-    def setUp(self):
-        self.superuser = self.create_user(email="a@example.com", is_superuser=True)
-        self.user = self.create_user(email="boop@example.com")
-        self.org = self.create_organization(owner=self.user)
-        self.super_org = self.create_organization(owner=self.superuser)
-
-        self.published_app = self.create_sentry_app(
+    @classmethod
+    def setUpTestData(cls):
+        # These instances are shared by every test in the class (Django 2.2 does not copy
+        # them per test), so treat them as read-only; only their DB rows are rolled back.
+        cls.superuser = Factories.create_user(email="a@example.com", is_superuser=True)
+        cls.user = Factories.create_user(email="boop@example.com")
+        cls.org = Factories.create_organization(owner=cls.user)
+        cls.super_org = Factories.create_organization(owner=cls.superuser)
+
+        cls.published_app = Factories.create_sentry_app(
             name="Test",
-            organization=self.super_org,
+            organization=cls.super_org,
             published=True,
             scopes=("org:write", "team:admin"),
         )
 
-        self.installation = self.create_sentry_app_installation(
-            slug=self.published_app.slug,
-            organization=self.super_org,
-            user=self.superuser,
+        cls.installation = Factories.create_sentry_app_installation(
+            slug=cls.published_app.slug,
+            organization=cls.super_org,
+            user=cls.superuser,
             status=SentryAppInstallationStatus.PENDING,
             prevent_token_exchange=True,
         )
 
-        self.unpublished_app = self.create_sentry_app(name="Testin", organization=self.org)
+        cls.unpublished_app = Factories.create_sentry_app(name="Testin", organization=cls.org)
 
-        self.installation2 = self.create_sentry_app_installation(
-            slug=self.unpublished_app.slug,
-            organization=self.org,
-            user=self.user,
+        cls.installation2 = Factories.create_sentry_app_installation(
+            slug=cls.unpublished_app.slug,
+            organization=cls.org,
+            user=cls.user,
             status=SentryAppInstallationStatus.PENDING,
             prevent_token_exchange=True,
         )
 
-        self.url = reverse(
-            "sentry-api-0-sentry-app-installation-details", args=[self.installation2.uuid]
+        cls.url = reverse(
+            "sentry-api-0-sentry-app-installation-details", args=[cls.installation2.uuid]
+        )
+        cls.published_url = reverse(
+            "sentry-api-0-sentry-app-installation-details", args=[cls.installation.uuid]
         )
 
 
@@ -67,9 +74,7 @@ class GetSentryAppInstallationDetailsTest(SentryAppInstallationDetailsTest):
     def test_no_access_outside_install_organization(self):
         self.login_as(user=self.user)
 
-        url = reverse("sentry-api-0-sentry-app-installation-details", args=[self.installation.uuid])
-
-        response = self.client.get(url, format="json")
+        response = self.client.get(self.published_url, format="json")
         assert response.status_code == 404
 
 
@@ -107,24 +112,24 @@ class DeleteSentryAppInstallationDetailsTest(SentryAppInstallationDetailsTest):
 
 @control_silo_test(stable=True)
 class MarkInstalledSentryAppInstallationsTest(SentryAppInstallationDetailsTest):
-    def setUp(self):
-        super().setUp()
-        self.token = GrantExchanger.run(
-            install=self.installation,
-            code=self.installation.api_grant.code,
-            client_id=self.published_app.application.client_id,
-            user=self.published_app.proxy_user,
+    def exchange_token(self, installation, app):
+        # GrantExchanger saves the token onto the instance it's given, so don't hand it
+        # the class-level fixture.
+        install = SentryAppInstallation.objects.get(id=installation.id)
+        return GrantExchanger.run(
+            install=install,
+            code=install.api_grant.code,
+            client_id=app.application.client_id,
+            user=app.proxy_user,
         )
 
     @patch("sentry.analytics.record")
     def test_sentry_app_installation_mark_installed(self, record):
-        self.url = reverse(
-            "sentry-api-0-sentry-app-installation-details", args=[self.installation.uuid]
-        )
+        token = self.exchange_token(self.installation, self.published_app)
         response = self.client.put(
-            self.url,
+            self.published_url,
             data={"status": "installed"},
-            HTTP_AUTHORIZATION=f"Bearer {self.token.token}",
+            HTTP_AUTHORIZATION=f"Bearer {token.token}",
             format="json",
         )
         assert response.status_code == 200
@@ -138,13 +143,11 @@ class MarkInstalledSentryAppInstallationsTest(SentryAppInstallationDetailsTest):
         )
 
     def test_sentry_app_installation_mark_pending_status(self):
-        self.url = reverse(
-            "sentry-api-0-sentry-app-installation-details", args=[self.installation.uuid]
-        )
+        token = self.exchange_token(self.installation, self.published_app)
         response = self.client.put(
-            self.url,
+            self.published_url,
             data={"status": "pending"},
-            HTTP_AUTHORIZATION=f"Bearer {self.token.token}",
+            HTTP_AUTHORIZATION=f"Bearer {token.token}",
             format="json",
         )
         assert response.status_code == 400
@@ -154,28 +157,16 @@ class MarkInstalledSentryAppInstallationsTest(SentryAppInstallationDetailsTest):
         )
 
     def test_sentry_app_installation_mark_installed_wrong_app(self):
-        self.token = GrantExchanger.run(
-            install=self.installation2,
-            code=self.installation2.api_grant.code,
-            client_id=self.unpublished_app.application.client_id,
-            user=self.unpublished_app.proxy_user,
-        )
-        self.url = reverse(
-            "sentry-api-0-sentry-app-installation-details", args=[self.installation.uuid]
-        )
+        token = self.exchange_token(self.installation2, self.unpublished_app)
         response = self.client.put(
-            self.url,
+            self.published_url,
             data={"status": "installed"},
-            HTTP_AUTHORIZATION=f"Bearer {self.token.token}",
+            HTTP_AUTHORIZATION=f"Bearer {token.token}",
             format="json",
         )
         assert response.status_code == 403
 
     def test_sentry_app_installation_mark_installed_no_token(self):
-        self.url = reverse(
-            "sentry-api-0-sentry-app-installation-details", args=[self.installation.uuid]
-        )
-
-        response = self.client.put(self.url, data={"status": "installed"}, format="json")
+        response = self.client.put(self.published_url, data={"status": "installed"}, format="json")
 
         assert response.status_code == 401
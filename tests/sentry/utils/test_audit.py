@@ -1,3 +1,5 @@
+import unittest
+
 from django.contrib.auth.models import AnonymousUser
 
 from sentry import audit_log
@@ -10,9 +12,28 @@ from sentry.models import (
     OrganizationStatus,
 )
 from sentry.testutils import TestCase
+from sentry.testutils.factories import Factories
 from sentry.utils.audit import create_audit_entry, create_system_audit_entry
 
 username = "hello" * 20
+# AuditLogEntry.actor_label is trimmed to 64 characters.
+trimmed_username = "hellohellohellohellohellohellohellohellohellohellohellohellohell"
+
+_EVT = {
+    name: audit_log.get_event_id(name)
+    for name in (
+        "ORG_REMOVE",
+        "ORG_RESTORE",
+        "ORG_EDIT",
+        "TEAM_REMOVE",
+        "PROJECT_REMOVE",
+        "PROJECT_EDIT",
+        "INTEGRATION_ADD",
+        "INTEGRATION_EDIT",
+        "INTEGRATION_REMOVE",
+        "SSO_DISABLE",
+    )
+}
 
 
 class FakeHttpRequest:
@@ -21,22 +42,11 @@ class FakeHttpRequest:
         self.META = {"REMOTE_ADDR": "127.0.0.1"}
 
 
-class CreateAuditEntryTest(TestCase):
-    def setUp(self):
-        self.user = self.create_user(username=username)
-        self.req = FakeHttpRequest(self.user)
-        self.org = self.create_organization(owner=self.user)
-        self.team = self.create_team(organization=self.org)
-        self.project = self.create_project(teams=[self.team], platform="java")
-
-    def assert_no_delete_log_created(self):
-        assert not DeletedOrganization.objects.filter(slug=self.org.slug).exists()
-        assert not DeletedTeam.objects.filter(slug=self.team.slug).exists()
-        assert not DeletedProject.objects.filter(slug=self.project.slug).exists()
-
+class CreateAuditEntryNoDBTest(unittest.TestCase):
     def test_audit_entry_api(self):
-        org = self.create_organization()
-        apikey = ApiKey.objects.create(organization_id=org.id, allowed_origins="*")
+        # Without an event no audit log row or delete log is written, so this
+        # runs without database access.
+        apikey = ApiKey(organization_id=1, allowed_origins="*")
 
         req = FakeHttpRequest(AnonymousUser())
         req.auth = apikey
@@ -46,7 +56,33 @@ class CreateAuditEntryTest(TestCase):
         assert entry.actor is None
         assert entry.ip_address == req.META["REMOTE_ADDR"]
 
-        self.assert_no_delete_log_created()
+
+class CreateAuditEntryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # These instances are shared by every test in the class (Django 2.2 does not copy
+        # them per test), so treat them as read-only; only their DB rows are rolled back.
+        cls.user = Factories.create_user(username=username)
+        cls.org = Factories.create_organization(owner=cls.user)
+        cls.team = Factories.create_team(organization=cls.org)
+        cls.project = Factories.create_project(teams=[cls.team], platform="java")
+
+    def setUp(self):
+        self.req = FakeHttpRequest(self.user)
+
+    def assert_no_delete_log_created(self):
+        deleted_slugs = (
+            DeletedOrganization.objects.filter(slug=self.org.slug)
+            .values_list("slug", flat=True)
+            .union(
+                DeletedTeam.objects.filter(slug=self.team.slug).values_list("slug", flat=True),
+                DeletedProject.objects.filter(slug=self.project.slug).values_list(
+                    "slug", flat=True
+                ),
+                all=True,
+            )
+        )
+        assert list(deleted_slugs) == []
 
     def test_audit_entry_frontend(self):
         req = FakeHttpRequest(self.create_user())
@@ -63,36 +99,26 @@ class CreateAuditEntryTest(TestCase):
             request=self.req,
             organization=self.org,
             target_object=self.org.id,
-            event=audit_log.get_event_id("ORG_REMOVE"),
+            event=_EVT["ORG_REMOVE"],
             data=self.org.get_audit_log_data(),
         )
 
         assert entry.actor == self.user
-        assert entry.actor_label == username[:64]  # needs trimming
+        assert entry.actor_label == trimmed_username
         assert entry.target_object == self.org.id
-        assert entry.event == audit_log.get_event_id("ORG_REMOVE")
+        assert entry.event == _EVT["ORG_REMOVE"]
 
         deleted_org = DeletedOrganization.objects.get(slug=self.org.slug)
         self.assert_valid_deleted_log(deleted_org, self.org)
 
     def test_audit_entry_org_restore_log(self):
-        Organization.objects.filter(id=self.organization.id).update(
-            status=OrganizationStatus.PENDING_DELETION
-        )
-
-        org = Organization.objects.get(id=self.organization.id)
-
-        Organization.objects.filter(id=self.organization.id).update(
-            status=OrganizationStatus.DELETION_IN_PROGRESS
+        org = Organization(
+            id=self.org.id, slug=self.org.slug, status=OrganizationStatus.PENDING_DELETION
         )
-
-        org2 = Organization.objects.get(id=self.organization.id)
-
-        Organization.objects.filter(id=self.organization.id).update(
-            status=OrganizationStatus.VISIBLE
+        org2 = Organization(
+            id=self.org.id, slug=self.org.slug, status=OrganizationStatus.DELETION_IN_PROGRESS
         )
-
-        org3 = Organization.objects.get(id=self.organization.id)
+        org3 = Organization(id=self.org.id, slug=self.org.slug, status=OrganizationStatus.VISIBLE)
 
         orgs = [org, org2, org3]
 
@@ -100,7 +126,7 @@ class CreateAuditEntryTest(TestCase):
             request=self.req,
             organization=self.org,
             target_object=self.org.id,
-            event=audit_log.get_event_id("ORG_RESTORE"),
+            event=_EVT["ORG_RESTORE"],
             data=self.org.get_audit_log_data(),
         )
         audit_log_event = audit_log.get(entry.event)
@@ -109,7 +135,7 @@ class CreateAuditEntryTest(TestCase):
             request=self.req,
             organization=self.org,
             target_object=self.org.id,
-            event=audit_log.get_event_id("ORG_EDIT"),
+            event=_EVT["ORG_EDIT"],
             data=self.org.get_audit_log_data(),
         )
         audit_log_event2 = audit_log.get(entry2.event)
@@ -123,26 +149,26 @@ class CreateAuditEntryTest(TestCase):
                 assert ("restored") in audit_log_event.render(entry)
                 assert entry.actor == self.user
                 assert entry.target_object == self.org.id
-                assert entry.event == audit_log.get_event_id("ORG_RESTORE")
+                assert entry.event == _EVT["ORG_RESTORE"]
             else:
                 assert i.status == OrganizationStatus.VISIBLE
                 assert ("edited") in audit_log_event2.render(entry2)
                 assert entry2.actor == self.user
                 assert entry2.target_object == self.org.id
-                assert entry2.event == audit_log.get_event_id("ORG_EDIT")
+                assert entry2.event == _EVT["ORG_EDIT"]
 
     def test_audit_entry_team_delete_log(self):
         entry = create_audit_entry(
             request=self.req,
             organization=self.org,
             target_object=self.team.id,
-            event=audit_log.get_event_id("TEAM_REMOVE"),
+            event=_EVT["TEAM_REMOVE"],
             data=self.team.get_audit_log_data(),
         )
 
         assert entry.actor == self.user
         assert entry.target_object == self.team.id
-        assert entry.event == audit_log.get_event_id("TEAM_REMOVE")
+        assert entry.event == _EVT["TEAM_REMOVE"]
 
         deleted_team = DeletedTeam.objects.get(slug=self.team.slug)
         self.assert_valid_deleted_log(deleted_team, self.team)
@@ -152,13 +178,13 @@ class CreateAuditEntryTest(TestCase):
             request=self.req,
             organization=self.org,
             target_object=self.project.id,
-            event=audit_log.get_event_id("PROJECT_REMOVE"),
+            event=_EVT["PROJECT_REMOVE"],
             data=self.project.get_audit_log_data(),
         )
 
         assert entry.actor == self.user
         assert entry.target_object == self.project.id
-        assert entry.event == audit_log.get_event_id("PROJECT_REMOVE")
+        assert entry.event == _EVT["PROJECT_REMOVE"]
 
         deleted_project = DeletedProject.objects.get(slug=self.project.slug)
         self.assert_valid_deleted_log(deleted_project, self.project)
@@ -169,14 +195,14 @@ class CreateAuditEntryTest(TestCase):
             request=self.req,
             organization=self.org,
             target_object=self.project.id,
-            event=audit_log.get_event_id("PROJECT_EDIT"),
+            event=_EVT["PROJECT_EDIT"],
             data={"old_slug": "old", "new_slug": "new"},
         )
         audit_log_event = audit_log.get(entry.event)
 
         assert entry.actor == self.user
         assert entry.target_object == self.project.id
-        assert entry.event == audit_log.get_event_id("PROJECT_EDIT")
+        assert entry.event == _EVT["PROJECT_EDIT"]
         assert audit_log_event.render(entry) == "renamed project slug from old to new"
 
     def test_audit_entry_project_edit_log_regression(self):
@@ -184,71 +210,49 @@ class CreateAuditEntryTest(TestCase):
             request=self.req,
             organization=self.org,
             target_object=self.project.id,
-            event=audit_log.get_event_id("PROJECT_EDIT"),
+            event=_EVT["PROJECT_EDIT"],
             data={"new_slug": "new"},
         )
         audit_log_event = audit_log.get(entry.event)
 
         assert entry.actor == self.user
         assert entry.target_object == self.project.id
-        assert entry.event == audit_log.get_event_id("PROJECT_EDIT")
+        assert entry.event == _EVT["PROJECT_EDIT"]
         assert audit_log_event.render(entry) == "edited project settings in new_slug to new"
 
-    def test_audit_entry_integration_log(self):
-        project = self.create_project()
-        self.login_as(user=self.user)
-
+    def assert_integration_log(self, event, substring):
         entry = create_audit_entry(
             request=self.req,
             organization=self.project.organization,
             target_object=self.project.id,
-            event=audit_log.get_event_id("INTEGRATION_ADD"),
-            data={"integration": "webhooks", "project": project.slug},
+            event=_EVT[event],
+            data={"integration": "webhooks", "project": self.project.slug},
         )
         audit_log_event = audit_log.get(entry.event)
 
-        assert ("enabled") in audit_log_event.render(entry)
+        assert substring in audit_log_event.render(entry)
         assert entry.actor == self.user
         assert entry.target_object == self.project.id
-        assert entry.event == audit_log.get_event_id("INTEGRATION_ADD")
+        assert entry.event == _EVT[event]
 
-        entry2 = create_audit_entry(
-            request=self.req,
-            organization=self.project.organization,
-            target_object=self.project.id,
-            event=audit_log.get_event_id("INTEGRATION_EDIT"),
-            data={"integration": "webhooks", "project": project.slug},
-        )
-        audit_log_event2 = audit_log.get(entry2.event)
-
-        assert ("edited") in audit_log_event2.render(entry2)
-        assert entry2.actor == self.user
-        assert entry2.target_object == self.project.id
-        assert entry2.event == audit_log.get_event_id("INTEGRATION_EDIT")
+    def test_audit_entry_integration_add_log(self):
+        self.assert_integration_log("INTEGRATION_ADD", "enabled")
 
-        entry3 = create_audit_entry(
-            request=self.req,
-            organization=self.project.organization,
-            target_object=self.project.id,
-            event=audit_log.get_event_id("INTEGRATION_REMOVE"),
-            data={"integration": "webhooks", "project": project.slug},
-        )
-        audit_log_event3 = audit_log.get(entry3.event)
+    def test_audit_entry_integration_edit_log(self):
+        self.assert_integration_log("INTEGRATION_EDIT", "edited")
 
-        assert ("disable") in audit_log_event3.render(entry3)
-        assert entry3.actor == self.user
-        assert entry3.target_object == self.project.id
-        assert entry3.event == audit_log.get_event_id("INTEGRATION_REMOVE")
+    def test_audit_entry_integration_remove_log(self):
+        self.assert_integration_log("INTEGRATION_REMOVE", "disable")
 
     def test_create_system_audit_entry(self):
         entry = create_system_audit_entry(
             organization=self.org,
             target_object=self.org.id,
-            event=audit_log.get_event_id("SSO_DISABLE"),
+            event=_EVT["SSO_DISABLE"],
             data={"provider": "GitHub"},
         )
 
-        assert entry.event == audit_log.get_event_id("SSO_DISABLE")
+        assert entry.event == _EVT["SSO_DISABLE"]
         assert entry.actor_label == "Sentry"
         assert entry.organization_id == self.org.id
         assert entry.target_object == self.org.id